@@ -282,7 +282,8 @@ class Dataset():
         data_pairs = DataPairs(observations, ground_truth, name=name)
         return data_pairs
 
-    def create_torch_dataset(self, part='train', reshape=None, transform=None):
+    def create_torch_dataset(self, part='train', reshape=None, transform=None,
+                             shard_len=None, shuffle=True):
         """
         Create a torch dataset wrapper for one part of this dataset.
 
@@ -299,6 +300,11 @@ class Dataset():
         If :meth:`supports_random_access` returns `True`, a subclass of
         of :class:`torch.utils.data.Dataset` is returned that retrieves
         samples using :meth:`get_sample`.
+        If additionally `shard_len` is specified, a
+        :class:`torch.utils.data.IterableDataset` is returned instead that
+        reads contiguous shards of samples via :meth:`get_samples`, which is
+        usually much faster for file-based datasets than random access per
+        sample (see :class:`dival.util.torch_utility.ShardedTorchDataset`).
 
         Parameters
         ----------
@@ -310,6 +316,13 @@ class Dataset():
         transform : callable, optional
             Transform to be applied on each sample, useful for augmentation.
             Default: `None`, i.e. no transform.
+        shard_len : int, optional
+            If specified and random access is supported, iterate over shards
+            of `shard_len` consecutive samples. For shuffled training, pass
+            ``shuffle=False`` to the DataLoader in this case.
+        shuffle : bool, optional
+            Whether to shuffle the shard order and the samples within each
+            shard. Only used if `shard_len` is specified. Default: ``True``.
 
         Returns
         -------
@@ -320,9 +333,14 @@ class Dataset():
             ``dataset.dataset``.
         """
         from dival.util.torch_utility import (
-            RandomAccessTorchDataset, GeneratorTorchDataset)
-
-        if self.supports_random_access():
+            RandomAccessTorchDataset, GeneratorTorchDataset,
+            ShardedTorchDataset)
+
+        if self.supports_random_access() and shard_len is not None:
+            dataset = ShardedTorchDataset(self, part, shard_len,
+                                          shuffle=shuffle, reshape=reshape,
+                                          transform=transform)
+        elif self.supports_random_access():
             dataset = RandomAccessTorchDataset(self, part, reshape=reshape,
                                                transform=transform)
         else:
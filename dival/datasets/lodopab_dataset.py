@@ -8,7 +8,12 @@ Provides simple access to the `LoDoPaB-CT dataset
 """
 import os
 from warnings import warn
-from math import ceil
+from math import ceil, log
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Thread, Event, Lock, local
+from queue import Queue, Full, Empty
+from collections import OrderedDict
+from importlib.util import find_spec
 import numpy as np
 import h5py
 from zipfile import ZipFile
@@ -20,6 +25,12 @@ from dival.config import CONFIG, set_config
 from dival.util.constants import MU_MAX
 from dival.util.zenodo_download import download_zenodo_record
 from dival.util.input import input_yes_no
+try:
+    from isal.isal_zlib import decompress as zlib_decompress
+except ImportError:
+    from zlib import decompress as zlib_decompress
+# numba is only imported when needed, since importing it is slow
+NUMBA_AVAILABLE = find_spec('numba') is not None
 
 
 try:
@@ -29,8 +40,19 @@ except Exception:
         'Could not retrieve config value `lodopab_dataset/data_path`, '
         'maybe the configuration (e.g. in ~/.dival/config.json) is corrupt.')
 NUM_SAMPLES_PER_FILE = 128
+MAX_READ_WORKERS = 8
+NUM_PREFETCH_BATCHES = 2
+FILE_CACHE_SIZE = 32
+FILE_CACHE_RDCC_NBYTES = 4 * 1024**2
+RDCC_NBYTES = 16 * 1024**2
+RDCC_NSLOTS = 521
 PHOTONS_PER_PIXEL = 4096
 ORIG_MIN_PHOTON_COUNT = 0.1
+# post-log observation values above this threshold stem from a simulated
+# photon count of zero (replaced by `ORIG_MIN_PHOTON_COUNT`)
+MIN_PHOTON_COUNT_THRES = 0.5 * (
+    -log(ORIG_MIN_PHOTON_COUNT/PHOTONS_PER_PIXEL)
+    - log(1/PHOTONS_PER_PIXEL)) / MU_MAX
 MIN_PT = [-0.13, -0.13]
 MAX_PT = [0.13, 0.13]
 LEN = {
@@ -47,6 +69,237 @@ PATIENT_ID_OFFSETS = {
     'test': NUM_PATIENTS['train'] + NUM_PATIENTS['validation']}
 
 
+def _post_log_replace(obs, thres0, replacement):
+    for i in range(obs.size):
+        if obs[i] >= thres0:
+            obs[i] = replacement
+
+
+_post_log_replace_kernel = None
+
+
+def _get_post_log_replace_kernel():
+    """
+    Return :func:`_post_log_replace` compiled with numba (on first call), or
+    `None` if numba is not available.
+
+    The kernel is not parallelized with numba's threading layers, which are
+    not safe to use from the reader threads of this module or in forked
+    processes (like torch DataLoader workers). Instead, it releases the GIL,
+    such that it can run concurrently to other threads.
+    The pre-log transform is computed with NumPy, whose vectorized ``np.exp``
+    is several times faster than the scalar exp in numba.
+    """
+    global _post_log_replace_kernel
+    if not NUMBA_AVAILABLE:
+        return None
+    if _post_log_replace_kernel is None:
+        try:
+            import numba
+        except ImportError:
+            return None
+        _post_log_replace_kernel = numba.njit(nogil=True, cache=True)(
+            _post_log_replace)
+    return _post_log_replace_kernel
+
+
+def _get_flat_view(obs):
+    """
+    Return a flat view of `obs` that can be passed to the numba kernel, or
+    `None` if `obs` is not a C-contiguous float32 array (or odl element
+    backed by one).
+    """
+    arr = np.asarray(obs)
+    if arr.dtype != np.float32 or not arr.flags.c_contiguous:
+        return None
+    return arr.reshape(-1)
+
+
+def _empty_aligned(nbytes, alignment=64):
+    """
+    Return an uninitialized byte array of length `nbytes`, whose data pointer
+    is a multiple of `alignment`.
+    """
+    buf = np.empty(nbytes + alignment, dtype=np.uint8)
+    offset = -buf.ctypes.data % alignment
+    return buf[offset:offset+nbytes]
+
+
+def _get_file_slices(range_):
+    """
+    Split the sample indices `range_` (with positive step) into the files.
+
+    Returns
+    -------
+    range_files : range
+        Indices of the files.
+    slices_files : list of slice
+        Slice into each file.
+    slices_data : list of slice
+        Slice into the concatenated samples for each file.
+    """
+    if range_.step == 1:
+        # fast path for contiguous indices
+        range_files = range(range_.start // NUM_SAMPLES_PER_FILE,
+                            (range_.stop - 1) // NUM_SAMPLES_PER_FILE + 1)
+        slices_files = []
+        slices_data = []
+        for i in range_files:
+            file_start = i * NUM_SAMPLES_PER_FILE
+            start = max(range_.start, file_start)
+            stop = min(range_.stop, file_start + NUM_SAMPLES_PER_FILE)
+            slices_files.append(slice(start - file_start, stop - file_start,
+                                      1))
+            slices_data.append(slice(start - range_.start,
+                                     stop - range_.start))
+        return range_files, slices_files, slices_data
+    range_files = range(range_[0] // NUM_SAMPLES_PER_FILE,
+                        range_[-1] // NUM_SAMPLES_PER_FILE + 1)
+    slices_files = []
+    slices_data = []
+    data_count = 0
+    for i in range_files:
+        if i == range_files.start:
+            start = range_.start % NUM_SAMPLES_PER_FILE
+        else:
+            start = (range_.start - i*NUM_SAMPLES_PER_FILE) % range_.step
+        if i == range_files[-1]:
+            stop = range_[-1] % NUM_SAMPLES_PER_FILE + 1
+        else:
+            next_start = ((range_.start - (i+1)*NUM_SAMPLES_PER_FILE)
+                          % range_.step)
+            stop = (next_start - range_.step) % NUM_SAMPLES_PER_FILE + 1
+        s = slice(start, stop, range_.step)
+        slices_files.append(s)
+        len_slice = ceil((s.stop-s.start) / s.step)
+        slices_data.append(slice(data_count, data_count+len_slice))
+        data_count += len_slice
+    return range_files, slices_files, slices_data
+
+
+def _get_file_path(name, part, file_index):
+    return os.path.join(DATA_PATH, '{}_{}_{:03d}.hdf5'
+                                   .format(name, part, file_index))
+
+
+def _open_file(path, rdcc_nbytes=RDCC_NBYTES):
+    """
+    Open an HDF5 file for reading with a chunk cache of `rdcc_nbytes` bytes
+    (HDF5's default of 1 MiB is too small to hold a single observation).
+    """
+    return h5py.File(path, 'r', rdcc_nbytes=rdcc_nbytes,
+                     rdcc_nslots=RDCC_NSLOTS)
+
+
+def _fadvise(path, advice):
+    """
+    Announce the access pattern for a whole file to the OS via
+    :func:`os.posix_fadvise`, if available. Errors are ignored, since the
+    advice is only a hint.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, advice)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _get_contiguous_layout(dataset):
+    """
+    Return ``(offset, dtype, shape)`` of a contiguously stored HDF5 dataset,
+    where `offset` is the byte offset of the data in the file.
+    If the dataset is chunked or the data is not allocated, or if
+    :func:`os.preadv` is not available, `None` is returned.
+    """
+    if not hasattr(os, 'preadv') or dataset.chunks is not None:
+        return None
+    offset = dataset.id.get_offset()
+    if offset is None:
+        return None
+    return (offset, dataset.dtype, dataset.shape)
+
+
+def _read_contiguous(path, layout, out, slc_f, slc_d):
+    """
+    Read ``data[slc_f]`` of a contiguously stored dataset into ``out[slc_d]``
+    using :func:`os.preadv`, bypassing h5py.
+
+    Returns ``False`` (without reading) if the direct read is not applicable,
+    i.e. if ``slc_f`` has a step other than 1 or ``out[slc_d]`` is not a
+    C-contiguous array of the dataset's dtype.
+    """
+    offset, dtype, shape = layout
+    if (not isinstance(out, np.ndarray) or out.dtype != dtype
+            or slc_f.step not in (None, 1)):
+        return False
+    start, stop, _ = slc_f.indices(shape[0])
+    dest = out[slc_d]
+    if (not dest.flags.c_contiguous
+            or dest.shape != (max(0, stop - start),) + shape[1:]):
+        return False
+    sample_nbytes = dtype.itemsize * int(np.prod(shape[1:]))
+    buf = memoryview(dest).cast('B')
+    pos = offset + start * sample_nbytes
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        while len(buf) > 0:
+            num_bytes = os.preadv(fd, [buf], pos)
+            if num_bytes == 0:
+                raise OSError("unexpected end of file '{}'".format(path))
+            buf = buf[num_bytes:]
+            pos += num_bytes
+    finally:
+        os.close(fd)
+    return True
+
+
+def _read_direct_chunks(dataset, out, slc_f, slc_d, executor):
+    """
+    Read ``dataset[slc_f]`` into ``out[slc_d]`` by reading the raw chunks and
+    decompressing them in `executor`, bypassing HDF5's filter pipeline.
+
+    Returns a list of futures for the decompression tasks, which write to
+    `out` when done, or `None` (without reading) if the direct chunk read is
+    not applicable, i.e. if the dataset is not chunked sample-wise or uses
+    other filters than gzip, or `out` is not an array of the dataset's dtype.
+    """
+    dtype = dataset.dtype
+    chunks = dataset.chunks
+    sample_shape = dataset.shape[1:]
+    if (chunks is None or chunks[1:] != sample_shape
+            or dataset.compression != 'gzip' or dataset.shuffle
+            or dataset.fletcher32 or dataset.scaleoffset is not None
+            or not isinstance(out, np.ndarray) or out.dtype != dtype):
+        return None
+    chunk_len = chunks[0]
+    # (index in chunk, index in out) pairs for each chunk
+    targets = {}
+    for i, j in zip(range(*slc_f.indices(dataset.shape[0])),
+                    range(*slc_d.indices(len(out)))):
+        targets.setdefault(i // chunk_len, []).append((i % chunk_len, j))
+
+    def decompress(chunk_index, filter_mask, data):
+        if not filter_mask & 1:  # gzip filter was applied
+            data = zlib_decompress(data)
+        chunk = np.frombuffer(data, dtype=dtype).reshape(
+            (chunk_len,) + sample_shape)
+        for i, j in targets[chunk_index]:
+            out[j] = chunk[i]
+
+    futures = []
+    for chunk_index in targets:
+        filter_mask, data = dataset.id.read_direct_chunk(
+            (chunk_index * chunk_len,) + (0,) * len(sample_shape))
+        futures.append(executor.submit(decompress, chunk_index, filter_mask,
+                                       data))
+    return futures
+
+
 def download_lodopab():
     global DATA_PATH
     print('Before downloading, please make sure to have enough free disk '
@@ -209,12 +462,26 @@ class LoDoPaBDataset(Dataset):
             self.min_photon_count = 1.
             warn('`min_photon_count` changed from {} to 1.'.format(
                 min_photon_count))
+        if (self.min_photon_count is None or
+                self.min_photon_count == ORIG_MIN_PHOTON_COUNT):
+            self._replacement = None
+        elif self.post_log:
+            self._replacement = -np.log(self.min_photon_count
+                                        / PHOTONS_PER_PIXEL) / MU_MAX
+        else:
+            self._replacement = self.min_photon_count / PHOTONS_PER_PIXEL
         self.sorted_by_patient = sorted_by_patient
         self.train_len = LEN['train']
         self.validation_len = LEN['validation']
         self.test_len = LEN['test']
         self.random_access = True
-        
+        self._contiguous_layouts = {}
+        self._observation_trafo = None
+        self._file_cache_pid = None
+        self._file_cache_init_lock = Lock()
+        self._sample_buffers = {}
+        self._thread_local = None
+
         if check_exists:
             while not LoDoPaBDataset.check_for_lodopab():
                 print('The LoDoPaB-CT dataset could not be found under the '
@@ -259,34 +526,99 @@ class LoDoPaBDataset(Dataset):
         super().__init__(space=(range_, domain))
         self.ray_trafo = self.get_ray_trafo(impl=impl)
 
-    def __get_observation_trafo(self, num_samples=1):
-        if (self.min_photon_count is None or
-                self.min_photon_count == ORIG_MIN_PHOTON_COUNT):
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the cached transform and the open files are not picklable, they
+        # are recreated lazily
+        state['_observation_trafo'] = None
+        state['_file_cache_pid'] = None
+        state['_sample_buffers'] = {}
+        state['_thread_local'] = None
+        state.pop('_file_cache', None)
+        state.pop('_file_cache_lock', None)
+        state.pop('_file_cache_init_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._file_cache_init_lock = Lock()
+
+    def __get_observation_trafo(self):
+        if self._observation_trafo is None:
+            self._observation_trafo = self.__create_observation_trafo()
+        return self._observation_trafo
+
+    def __create_observation_trafo(self):
+        # The returned transform is applied in-place to a single observation
+        # or to a batch of observations (stacked in the first dimension).
+        # If numba is available, the post-log replacement is computed by a
+        # kernel in a single pass over the data (see `_get_flat_view`).
+        # Otherwise, each sample is processed separately, such that the mask
+        # never has more than ``1000 x 513`` elements.
+        if self._replacement is None:
             if self.post_log:
                 def observation_trafo(out):
                     pass
             else:
                 def observation_trafo(obs):
-                    obs *= MU_MAX
-                    np.exp(-obs, out=obs)
+                    obs = np.asarray(obs)
+                    np.multiply(obs, -MU_MAX, out=obs)
+                    np.exp(obs, out=obs)
         else:
-            shape = (self.shape[0] if num_samples == 1 else
-                     (num_samples,) + self.shape[0])
-            mask = np.empty(shape, dtype=np.bool)
-            thres0 = 0.5 * (
-                -np.log(ORIG_MIN_PHOTON_COUNT/PHOTONS_PER_PIXEL)
-                - np.log(1/PHOTONS_PER_PIXEL)) / MU_MAX
+            # the mask is not needed by the numba kernel and is allocated
+            # lazily once per thread
+            thread_local = local()
+
+            def get_mask():
+                mask = getattr(thread_local, 'mask', None)
+                if mask is None:
+                    mask = np.empty(self.shape[0], dtype=bool)
+                    thread_local.mask = mask
+                return mask
+
+            def iter_samples(obs):
+                obs = np.asarray(obs)
+                return obs[np.newaxis] if obs.ndim == 2 else obs
+
+            thres0 = MIN_PHOTON_COUNT_THRES
+            replacement = self._replacement
+            # Only the values for a simulated photon count of zero lie above
+            # `thres0`, all others stem from at least one photon. Therefore,
+            # for ``min_photon_count >= ORIG_MIN_PHOTON_COUNT`` (it is at most
+            # 1) the replacement is equivalent to clipping, which needs no
+            # mask.
+            clip = self.min_photon_count >= ORIG_MIN_PHOTON_COUNT
             if self.post_log:
+                kernel = _get_post_log_replace_kernel()
+
                 def observation_trafo(obs):
-                    np.greater_equal(obs, thres0, out=mask)
-                    obs[mask] = -np.log(self.min_photon_count
-                                        / PHOTONS_PER_PIXEL) / MU_MAX
+                    obs_flat = (_get_flat_view(obs) if kernel is not None
+                                else None)
+                    if obs_flat is not None:
+                        kernel(obs_flat, thres0, replacement)
+                        return
+                    if clip:
+                        obs = np.asarray(obs)
+                        np.minimum(obs, replacement, out=obs)
+                        return
+                    mask = get_mask()
+                    for sample in iter_samples(obs):
+                        np.greater_equal(sample, thres0, out=mask)
+                        np.putmask(sample, mask, replacement)
             else:
                 def observation_trafo(obs):
-                    np.greater_equal(obs, thres0, out=mask)
-                    obs *= MU_MAX
-                    np.exp(-obs, out=obs)
-                    obs[mask] = self.min_photon_count/PHOTONS_PER_PIXEL
+                    if clip:
+                        obs = np.asarray(obs)
+                        np.multiply(obs, -MU_MAX, out=obs)
+                        np.exp(obs, out=obs)
+                        np.maximum(obs, replacement, out=obs)
+                        return
+                    mask = get_mask()
+                    for sample in iter_samples(obs):
+                        np.greater_equal(sample, thres0, out=mask)
+                        np.multiply(sample, -MU_MAX, out=sample)
+                        np.exp(sample, out=sample)
+                        np.putmask(sample, mask, replacement)
         return observation_trafo
 
     def generator(self, part='train'):
@@ -306,29 +638,177 @@ class LoDoPaBDataset(Dataset):
                 passed to :meth:`__init__`.
             `ground_truth` : odl element with shape ``(362, 362)``
                 The values lie in the range ``[0., 1.]``.
+
+        *Note:* The samples are read in batches of 32 by a background thread
+        (see :meth:`generator_arrays`), and the yielded elements are views
+        into these batches. Up to ``NUM_PREFETCH_BATCHES + 2`` batches (about
+        330 MB) are held in memory, plus the batches of samples that are kept
+        by the caller.
         """
         if self.sorted_by_patient:
             # fall back to default implementation
             yield from super().generator(part=part)
             return
-        num_files = ceil(self.get_len(part) / NUM_SAMPLES_PER_FILE)
-        observation_trafo = self.__get_observation_trafo()
-        for i in range(num_files):
-            with h5py.File(
-                    os.path.join(DATA_PATH, 'ground_truth_{}_{:03d}.hdf5'
-                                            .format(part, i)), 'r') as file:
-                ground_truth_data = file['data'][:]
-            with h5py.File(
-                    os.path.join(DATA_PATH, 'observation_{}_{:03d}.hdf5'
-                                            .format(part, i)), 'r') as file:
-                observation_data = file['data'][:]
-            for gt_arr, obs_arr in zip(ground_truth_data, observation_data):
+        # the batch size is chosen such that all batches in flight together
+        # hold the samples of one file
+        for obs_batch, gt_batch in self.generator_arrays(
+                part=part,
+                batch_size=NUM_SAMPLES_PER_FILE // (NUM_PREFETCH_BATCHES + 2),
+                reuse_buffers=False):
+            for obs_arr, gt_arr in zip(obs_batch, gt_batch):
                 ground_truth = self.space[1].element(gt_arr)
                 observation = self.space[0].element(obs_arr)
-                observation_trafo(observation)
 
                 yield (observation, ground_truth)
 
+    def generator_arrays(self, part='train',
+                         batch_size=NUM_SAMPLES_PER_FILE, dtype=np.float32,
+                         drop_page_cache=False, reuse_buffers=True):
+        """Yield batches of low dose observations and (virtual) ground truth
+        as plain arrays.
+
+        The batches are read by a background thread (using
+        :meth:`get_samples`), which runs up to ``NUM_PREFETCH_BATCHES`` batches
+        ahead of the consumer.
+
+        *Note:* By default, the yielded arrays are views into buffers that are
+        reused for subsequent batches, i.e. they are only valid until the next
+        batch is requested. Copy them if they are needed for longer, or pass
+        ``reuse_buffers=False``.
+
+        Parameters
+        ----------
+        part : {``'train'``, ``'validation'``, ``'test'``}, optional
+            The data part. Default is ``'train'``.
+        batch_size : int, optional
+            Number of samples per batch. The last batch may be smaller.
+            Default is ``128``, the number of samples per HDF5 file.
+        dtype : data-type, optional
+            Data type of the yielded arrays (see :meth:`get_samples`).
+            Default: ``np.float32``.
+        drop_page_cache : bool, optional
+            Whether to advise the OS to drop each file from the page cache
+            after it has been read (and to read ahead the next file).
+            This is useful for a pass over a part that does not fit into
+            memory (like ``'train'``), in order to avoid evicting other data
+            from the page cache. It is not applied if
+            ``self.sorted_by_patient``.
+            Default: ``False``.
+        reuse_buffers : bool, optional
+            Whether to read the batches into ``NUM_PREFETCH_BATCHES + 2``
+            reused buffers. If ``False``, new arrays are created for each
+            batch, which stay valid.
+            Default: ``True``.
+
+        Yields
+        ------
+        (observation, ground_truth)
+            `observation` : :class:`np.ndarray`
+                Shape ``(batch_size, 1000, 513)``.
+                The values depend on the
+                `observation_model` and `min_photon_count` parameters that were
+                passed to :meth:`__init__`.
+            `ground_truth` : :class:`np.ndarray`
+                Shape ``(batch_size, 362, 362)``.
+                The values lie in the range ``[0., 1.]``.
+        """
+        len_part = self.get_len(part)
+        # Slots are passed from the consumer to the reader thread via
+        # `free_slots` and back via `batch_queue`. ``None`` is passed as a
+        # sentinel after the last batch.
+        free_slots = Queue()
+        if reuse_buffers:
+            num_slots = NUM_PREFETCH_BATCHES + 2
+            obs_buffers = [
+                np.empty((batch_size,) + self.shape[0], dtype=dtype)
+                for _ in range(num_slots)]
+            gt_buffers = [
+                np.empty((batch_size,) + self.shape[1], dtype=dtype)
+                for _ in range(num_slots)]
+            for slot in range(num_slots):
+                free_slots.put(slot)
+        batch_queue = Queue(maxsize=NUM_PREFETCH_BATCHES)
+        stop = Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batch_queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def get_free_slot():
+            while not stop.is_set():
+                try:
+                    return free_slots.get(timeout=0.1)
+                except Empty:
+                    pass
+            return None
+
+        num_files = ceil(len_part / NUM_SAMPLES_PER_FILE)
+
+        def advise_files(file_indices, advice_name):
+            if (not drop_page_cache or self.sorted_by_patient
+                    or not hasattr(os, 'posix_fadvise')):
+                return
+            for i in file_indices:
+                if i < num_files:
+                    for name in ['observation', 'ground_truth']:
+                        _fadvise(_get_file_path(name, part, i),
+                                 getattr(os, advice_name))
+
+        def read_batches():
+            # files with index < `advised` have been advised to be read ahead,
+            # files with index < `dropped` have been dropped from page cache
+            advised, dropped = 0, 0
+            try:
+                for start in range(0, len_part, batch_size):
+                    n = min(batch_size, len_part - start)
+                    if reuse_buffers:
+                        slot = get_free_slot()
+                        if slot is None:
+                            return
+                        out = (obs_buffers[slot][:n], gt_buffers[slot][:n])
+                    else:
+                        slot, out = None, (True, True)
+                    next_file = (start + n - 1) // NUM_SAMPLES_PER_FILE + 1
+                    advise_files(range(advised, next_file + 1),
+                                 'POSIX_FADV_WILLNEED')
+                    advised = max(advised, next_file + 1)
+                    obs, gt = self.get_samples(range(start, start + n),
+                                               part=part, out=out, dtype=dtype)
+                    done = ((start + n) // NUM_SAMPLES_PER_FILE
+                            if start + n < len_part else num_files)
+                    advise_files(range(dropped, done), 'POSIX_FADV_DONTNEED')
+                    dropped = done
+                    if not put((slot, obs, gt)):
+                        return
+            except Exception as e:
+                put(e)
+                return
+            put(None)
+
+        thread = Thread(target=read_batches, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = batch_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                slot, obs, gt = item
+                yield (obs, gt)
+                if slot is not None:
+                    free_slots.put(slot)
+        finally:
+            stop.set()
+            # wait for the current read to finish, the reader thread must not
+            # be inside h5py when the interpreter shuts down
+            thread.join()
+
     def get_ray_trafo(self, **kwargs):
         """
         Return the ray transform that is a noiseless version of the forward
@@ -395,6 +875,9 @@ class LoDoPaBDataset(Dataset):
                 `out`), a newly created odl element, ``out_ground_truth`` or
                 `None` is returned.
                 The values lie in the range ``[0., 1.]``.
+
+        *Note:* The HDF5 files are kept open for subsequent calls (at most
+        ``FILE_CACHE_SIZE`` files). They can be closed by :meth:`close`.
         """
         len_part = self.get_len(part)
         if index >= len_part or index < -len_part:
@@ -407,37 +890,30 @@ class LoDoPaBDataset(Dataset):
         (out_observation, out_ground_truth) = out
         if self.sorted_by_patient:
             index = self._idx_sorted_by_patient[part][index]
-        file_index = index // NUM_SAMPLES_PER_FILE
-        index_in_file = index % NUM_SAMPLES_PER_FILE
         if isinstance(out_observation, bool):
-            obs = self.space[0].zero() if out_observation else None
+            obs = (np.empty(self.shape[0], dtype=np.float32)
+                   if out_observation else None)
         else:
             obs = out_observation
         if isinstance(out_ground_truth, bool):
-            gt = self.space[1].zero() if out_ground_truth else None
+            gt = (np.empty(self.shape[1], dtype=np.float32)
+                  if out_ground_truth else None)
         else:
             gt = out_ground_truth
         if obs is not None:
-            with h5py.File(
-                    os.path.join(DATA_PATH,
-                                 'observation_{}_{:03d}.hdf5'
-                                 .format(part, file_index)), 'r') as file:
-                file['data'].read_direct(np.asarray(obs)[np.newaxis],
-                                         np.s_[index_in_file:index_in_file+1],
-                                         np.s_[0:1])
+            self._read_sample('observation', part, index, obs)
             observation_trafo = self.__get_observation_trafo()
             observation_trafo(obs)
+            if out_observation is True:
+                obs = self.space[0].element(obs)
         if gt is not None:
-            with h5py.File(
-                    os.path.join(DATA_PATH,
-                                 'ground_truth_{}_{:03d}.hdf5'
-                                 .format(part, file_index)), 'r') as file:
-                file['data'].read_direct(np.asarray(gt)[np.newaxis],
-                                         np.s_[index_in_file:index_in_file+1],
-                                         np.s_[0:1])
+            self._read_sample('ground_truth', part, index, gt)
+            if out_ground_truth is True:
+                gt = self.space[1].element(gt)
         return (obs, gt)
 
-    def get_samples(self, key, part='train', out=None):
+    def get_samples(self, key, part='train', out=None, impl='h5py',
+                    reuse_buffers=False, dtype=np.float32):
         """
         Get slice of the dataset.
         Returns a pair of (virtual) ground truth data and its low dose
@@ -462,6 +938,37 @@ class LoDoPaBDataset(Dataset):
                 If ``True``, a new array holding the ground truth data is
                 created (the default).
                 If ``False``, no ground truth data is returned.
+        impl : {``'h5py'``, ``'direct_chunk'``}, optional
+            How to read chunked (compressed) HDF5 data.
+            The default is ``'h5py'``.
+
+            ``'h5py'``
+                Read via ``read_direct`` of h5py, which decompresses the
+                chunks in HDF5's filter pipeline while holding h5py's global
+                lock.
+            ``'direct_chunk'``
+                Read the raw chunks and decompress them in multiple threads
+                (using ``isal`` if available, else ``zlib``).
+                Only applicable to gzip-compressed data chunked sample-wise,
+                otherwise ``'h5py'`` is used as a fallback.
+        reuse_buffers : bool, optional
+            Whether to return views into internal buffers instead of newly
+            created arrays, if ``True`` is passed for the respective element
+            of `out`. The buffers are kept per number of samples and are
+            64-byte aligned. They are overwritten by the next call with the
+            same number of samples and ``reuse_buffers=True``, so the returned
+            arrays must not be used after such a call (copy them if needed).
+            Default: ``False``.
+        dtype : data-type, optional
+            Data type of the returned arrays, e.g. ``np.float16`` to halve
+            the memory footprint.
+            The data is read and transformed (cf. `observation_model`) with
+            ``float32`` precision into reused internal buffers (kept per
+            thread), and converted afterwards.
+            If arrays are passed in `out`, this argument is ignored, and the
+            data is converted to the data type of these arrays.
+            `reuse_buffers` only applies to ``float32`` arrays.
+            Default: ``np.float32``.
 
         Returns
         -------
@@ -483,6 +990,39 @@ class LoDoPaBDataset(Dataset):
                 is returned.
                 The values lie in the range ``[0., 1.]``.
         """
+        if impl not in ('h5py', 'direct_chunk'):
+            raise ValueError("`impl` must be 'h5py' or 'direct_chunk', not "
+                             "'{}'".format(impl))
+        if out is None:
+            out = (True, True)
+        if any((np.dtype(dtype) if isinstance(out_val, bool) else
+                out_val.dtype) != np.float32 for out_val in out):
+            # read the elements that are not float32 into reused per-thread
+            # float32 buffers, which are converted afterwards
+            if isinstance(key, slice):
+                num_samples = len(range(*key.indices(self.get_len(part))))
+            else:
+                num_samples = len(key)
+            staging_buffers = self._get_staging_buffers(num_samples)
+            out_float32 = []
+            for out_val, buffer in zip(out, staging_buffers):
+                if out_val is not False and (
+                        np.dtype(dtype) if out_val is True
+                        else out_val.dtype) != np.float32:
+                    out_val = buffer
+                out_float32.append(out_val)
+            samples_float32 = self.get_samples(
+                key, part=part, out=tuple(out_float32), impl=impl,
+                reuse_buffers=reuse_buffers)
+            samples = ()
+            for out_val, s in zip(out, samples_float32):
+                if isinstance(out_val, bool):
+                    s = s.astype(dtype, copy=False) if out_val else None
+                elif s is not out_val:
+                    out_val[:] = s
+                    s = out_val
+                samples = samples + (s,)
+            return samples
         if self.sorted_by_patient:
             # fall back to default implementation
             return super().get_samples(key, part=part, out=out)
@@ -505,32 +1045,15 @@ class LoDoPaBDataset(Dataset):
         if range_[-1] >= len_part:
             raise IndexError("key {} out of bounds for part '{}' ({:d})"
                              .format(key, part, len_part))
-        range_files = range(range_[0] // NUM_SAMPLES_PER_FILE,
-                            range_[-1] // NUM_SAMPLES_PER_FILE + 1)
-        if out is None:
-            out = (True, True)
+        range_files, slices_files, slices_data = _get_file_slices(range_)
         (out_observation, out_ground_truth) = out
-        # compute slice objects
-        slices_files = []
-        slices_data = []
-        data_count = 0
-        for i in range_files:
-            if i == range_files.start:
-                start = range_.start % NUM_SAMPLES_PER_FILE
-            else:
-                start = (range_.start - i*NUM_SAMPLES_PER_FILE) % range_.step
-            if i == range_files[-1]:
-                stop = range_[-1] % NUM_SAMPLES_PER_FILE + 1
-            else:
-                __next_start = ((range_.start - (i+1)*NUM_SAMPLES_PER_FILE)
-                                % range_.step)
-                stop = (__next_start - range_.step) % NUM_SAMPLES_PER_FILE + 1
-            s = slice(start, stop, range_.step)
-            slices_files.append(s)
-            len_slice = ceil((s.stop-s.start) / s.step)
-            slices_data.append(slice(data_count, data_count+len_slice))
-            data_count += len_slice
         # read data
+        if reuse_buffers:
+            obs_buffer, gt_buffer = self._get_sample_buffers(len(range_))
+            if out_observation is True:
+                out_observation = obs_buffer
+            if out_ground_truth is True:
+                out_ground_truth = gt_buffer
         if isinstance(out_observation, bool):
             obs_arr = (np.empty((len(range_),) + self.shape[0],
                                 dtype=np.float32) if out_observation else None)
@@ -541,25 +1064,254 @@ class LoDoPaBDataset(Dataset):
                                dtype=np.float32) if out_ground_truth else None)
         else:
             gt_arr = out_ground_truth
-        if obs_arr is not None:
-            for i, slc_f, slc_d in zip(range_files, slices_files, slices_data):
-                with h5py.File(
-                        os.path.join(DATA_PATH,
-                                     'observation_{}_{:03d}.hdf5'
-                                     .format(part, i)), 'r') as file:
-                    file['data'].read_direct(obs_arr, slc_f, slc_d)
-            observation_trafo = self.__get_observation_trafo(
-                num_samples=len(obs_arr))
-            observation_trafo(obs_arr)
-        if gt_arr is not None:
-            for i, slc_f, slc_d in zip(range_files, slices_files, slices_data):
-                with h5py.File(
-                        os.path.join(DATA_PATH,
-                                     'ground_truth_{}_{:03d}.hdf5'
-                                     .format(part, i)), 'r') as file:
-                    file['data'].read_direct(gt_arr, slc_f, slc_d)
+        if obs_arr is None:
+            if gt_arr is not None:
+                self._read_files('ground_truth', part, gt_arr,
+                                 range_files, slices_files, slices_data,
+                                 impl=impl)
+            return (obs_arr, gt_arr)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # the ground truth files are read concurrently to the observation
+            # files and the observation transform
+            gt_future = None
+            if gt_arr is not None:
+                gt_future = executor.submit(
+                    self._read_files, 'ground_truth', part, gt_arr,
+                    range_files, slices_files, slices_data, impl=impl)
+            # the transform is applied to the samples from each file while
+            # the remaining files are still being read
+            observation_trafo = self.__get_observation_trafo()
+            self._read_files('observation', part, obs_arr,
+                             range_files, slices_files, slices_data,
+                             impl=impl, callback=lambda slc_d:
+                             observation_trafo(obs_arr[slc_d]))
+            if gt_future is not None:
+                gt_future.result()
         return (obs_arr, gt_arr)
 
+    def close(self):
+        """Close the HDF5 files kept open by :meth:`get_sample`.
+
+        The dataset can still be used afterwards, files are reopened when
+        needed.
+        """
+        file_cache, file_cache_lock = self._get_file_cache()
+        with file_cache_lock:
+            for file in file_cache.values():
+                file.close()
+            file_cache.clear()
+
+    def _allocate_sample_buffers(self, num_samples):
+        """Allocate float32 observation and ground truth buffers.
+
+        Both buffers are views into a single allocation, each starting at a
+        64-byte aligned address.
+        """
+        shapes = [(num_samples,) + shape for shape in self.shape]
+        nbytes = [np.prod(shape) * np.dtype(np.float32).itemsize
+                  for shape in shapes]
+        gt_start = -(-nbytes[0] // 64) * 64
+        buf = _empty_aligned(gt_start + nbytes[1])
+        return (
+            buf[:nbytes[0]].view(np.float32).reshape(shapes[0]),
+            buf[gt_start:gt_start+nbytes[1]].view(np.float32).reshape(
+                shapes[1]))
+
+    def _get_sample_buffers(self, num_samples):
+        """Return reusable observation and ground truth buffers (see
+        `reuse_buffers` parameter of :meth:`get_samples`).
+        """
+        buffers = self._sample_buffers.get(num_samples)
+        if buffers is None:
+            buffers = self._allocate_sample_buffers(num_samples)
+            self._sample_buffers[num_samples] = buffers
+        return buffers
+
+    def _get_thread_local(self):
+        thread_local = self._thread_local
+        if thread_local is None:
+            thread_local = local()
+            self._thread_local = thread_local
+        return thread_local
+
+    def _get_staging_buffers(self, num_samples):
+        """Return float32 buffers for reading data that is converted to
+        another data type afterwards.
+
+        The buffers are kept per thread and are only reallocated if more
+        samples are requested than in any previous call from the thread.
+        """
+        thread_local = self._get_thread_local()
+        buffers = getattr(thread_local, 'staging_buffers', None)
+        if buffers is None or len(buffers[0]) < num_samples:
+            buffers = self._allocate_sample_buffers(num_samples)
+            thread_local.staging_buffers = buffers
+        return tuple(buf[:num_samples] for buf in buffers)
+
+    def _get_single_sample_buffer(self, name):
+        """Return a reusable buffer of shape ``(1,) + sample_shape``.
+
+        The buffers are allocated lazily once per thread.
+        """
+        thread_local = self._get_thread_local()
+        buffers = getattr(thread_local, 'buffers', None)
+        if buffers is None:
+            buffers = {}
+            thread_local.buffers = buffers
+        buf = buffers.get(name)
+        if buf is None:
+            shape = self.shape[0 if name == 'observation' else 1]
+            buf = np.empty((1,) + shape, dtype=np.float32)
+            buffers[name] = buf
+        return buf
+
+    def _read_sample(self, name, part, index, out):
+        """Read a single sample from the HDF5 files into `out`.
+
+        Outputs that are C-contiguous float32 arrays (or odl elements backed
+        by one) are read into directly, other outputs (e.g. strided views or
+        arrays of another data type) are filled from a per-thread buffer.
+        """
+        file_index = index // NUM_SAMPLES_PER_FILE
+        index_in_file = index % NUM_SAMPLES_PER_FILE
+        slc_f = np.s_[index_in_file:index_in_file+1]
+        arr = np.asarray(out)
+        if arr.flags.c_contiguous and arr.dtype == np.float32:
+            shape = self.shape[0 if name == 'observation' else 1]
+            self._read_file(name, part, file_index, arr.reshape((1,) + shape),
+                            slc_f, np.s_[0:1], use_file_cache=True)
+        else:
+            buf = self._get_single_sample_buffer(name)
+            self._read_file(name, part, file_index, buf, slc_f, np.s_[0:1],
+                            use_file_cache=True)
+            out[:] = buf[0]
+
+    def _get_file_cache(self):
+        """Return the cache of open files and its lock.
+
+        The cache is (re-)created in each process, such that file handles
+        are never shared between forked processes (like torch DataLoader
+        workers). The creation is guarded by a lock, such that concurrent
+        first calls do not create separate caches (leaking the files opened
+        in all but one of them).
+        """
+        pid = os.getpid()
+        with self._file_cache_init_lock:
+            if self._file_cache_pid != pid:
+                self._file_cache = OrderedDict()
+                self._file_cache_lock = Lock()
+                self._file_cache_pid = pid
+            return self._file_cache, self._file_cache_lock
+
+    def _read_file(self, name, part, file_index, out, slc_f, slc_d,
+                   use_file_cache=False, decompress_executor=None):
+        """Read ``data[slc_f]`` from one HDF5 file into ``out[slc_d]``.
+
+        The layout of each file is determined on first access. Contiguously
+        stored data is subsequently read directly via :func:`os.preadv`,
+        which does not hold h5py's global lock. Otherwise (and as a fallback
+        for unsupported `out` arrays or slices) ``read_direct`` of h5py is
+        used.
+
+        If `use_file_cache` is ``True``, the HDF5 file is kept open for
+        subsequent calls (the least recently used of at most
+        ``FILE_CACHE_SIZE`` files is closed when another one is opened).
+        This avoids the cost of re-opening a file for each sample with
+        random access.
+
+        If `decompress_executor` is specified, compressed chunks are read
+        raw and decompressed asynchronously in the executor if possible (see
+        :func:`_read_direct_chunks`). The futures of the decompression tasks
+        are returned, which must be waited for before using `out`.
+        """
+        path = _get_file_path(name, part, file_index)
+        key = (name, part, file_index)
+        layout = self._contiguous_layouts.get(key)
+        if layout is not None and _read_contiguous(path, layout, out, slc_f,
+                                                   slc_d):
+            return []
+
+        def read(file):
+            if key not in self._contiguous_layouts:
+                self._contiguous_layouts[key] = _get_contiguous_layout(
+                    file['data'])
+            if decompress_executor is not None:
+                futures = _read_direct_chunks(file['data'], out, slc_f, slc_d,
+                                              decompress_executor)
+                if futures is not None:
+                    return futures
+            file['data'].read_direct(out, slc_f, slc_d)
+            return []
+
+        if not use_file_cache:
+            with _open_file(path) as file:
+                return read(file)
+        file_cache, file_cache_lock = self._get_file_cache()
+        # h5py serializes its calls anyway, so the lock is held during the
+        # read, which prevents closing a file that is being read
+        with file_cache_lock:
+            file = file_cache.get(path)
+            if file is None:
+                file = _open_file(path, rdcc_nbytes=FILE_CACHE_RDCC_NBYTES)
+                file_cache[path] = file
+                if len(file_cache) > FILE_CACHE_SIZE:
+                    file_cache.popitem(last=False)[1].close()
+            else:
+                file_cache.move_to_end(path)
+            return read(file)
+
+    def _read_files(self, name, part, out, range_files, slices_files,
+                    slices_data, impl='h5py', callback=None):
+        """Read slices from multiple HDF5 files into `out`.
+
+        Each file is read in its own thread (at most ``MAX_READ_WORKERS``
+        threads), such that the reads from the different files can be issued
+        concurrently.
+        With ``impl='direct_chunk'``, the files are read sequentially instead,
+        while the chunks are decompressed in ``MAX_READ_WORKERS`` threads.
+
+        If `callback` is specified, ``callback(slc_d)`` is called in the
+        calling thread for each file as soon as ``out[slc_d]`` is filled,
+        while the remaining files are still being read.
+        With ``impl='direct_chunk'``, the callbacks only start after the raw
+        chunks of all files have been read, i.e. they overlap with the
+        decompression, but not with the file reads.
+        """
+        if impl == 'direct_chunk':
+            with ThreadPoolExecutor(
+                    max_workers=MAX_READ_WORKERS) as decompress_executor:
+                futures_files = []
+                for i, slc_f, slc_d in zip(range_files, slices_files,
+                                           slices_data):
+                    futures_files.append(self._read_file(
+                        name, part, i, out, slc_f, slc_d,
+                        decompress_executor=decompress_executor))
+                for futures, slc_d in zip(futures_files, slices_data):
+                    for future in futures:
+                        future.result()
+                    if callback is not None:
+                        callback(slc_d)
+            return
+
+        def read_file(i, slc_f, slc_d):
+            self._read_file(name, part, i, out, slc_f, slc_d)
+        if len(range_files) == 1:
+            read_file(range_files[0], slices_files[0], slices_data[0])
+            if callback is not None:
+                callback(slices_data[0])
+            return
+        with ThreadPoolExecutor(max_workers=min(
+                MAX_READ_WORKERS, len(range_files))) as executor:
+            futures = {
+                executor.submit(read_file, i, slc_f, slc_d): slc_d
+                for i, slc_f, slc_d in zip(range_files, slices_files,
+                                           slices_data)}
+            for future in as_completed(futures):
+                # re-raise possible exceptions
+                future.result()
+                if callback is not None:
+                    callback(futures[future])
+
     def get_indices_for_patient(self, rel_patient_id, part='train'):
         """
         Return the indices of the samples from one patient.
@@ -664,7 +1416,7 @@ class LoDoPaBDataset(Dataset):
             ids[part] = np.loadtxt(
                 os.path.join(DATA_PATH,
                              'patient_ids_rand_{}.csv'.format(part)),
-                dtype=np.int)
+                dtype=int)
             if relative:
                 ids[part] = LoDoPaBDataset._abs_to_rel_patient_id(ids[part],
                                                                   part)
@@ -157,8 +157,9 @@ class L2Measure(Measure):
                    'sqrt(sum((reconstruction-ground_truth)**2))')
 
     def apply(self, reconstruction, ground_truth):
-        return np.linalg.norm((np.asarray(reconstruction) -
-                               np.asarray(ground_truth)).flat)
+        # the difference is a new contiguous array, so `ravel` does not copy
+        diff = np.asarray(reconstruction) - np.asarray(ground_truth)
+        return np.linalg.norm(diff.ravel())
 
 
 L2 = L2Measure()
@@ -97,6 +97,89 @@ class GeneratorTorchDataset(torch.utils.data.IterableDataset):
                 sample = self.transform(sample)
             yield sample
 
+class ShardedTorchDataset(torch.utils.data.IterableDataset):
+    """
+    Torch dataset iterating over a random access dataset in contiguous shards.
+
+    Each shard is read at once via ``dataset.get_samples``, which is much
+    faster than per-sample random access for datasets stored in files with
+    sequential layout (e.g. HDF5).
+    Shuffling is performed on the order of the shards and within each shard.
+    When used with multiple DataLoader workers, the shards are split between
+    the workers, so each sample is yielded exactly once per epoch.
+    """
+    def __init__(self, dataset, part, shard_len, shuffle=True, reshape=None,
+                 transform=None):
+        """
+        Parameters
+        ----------
+        dataset : :class:`dival.datasets.Dataset`
+            Dataset supporting random access.
+        part : {``'train'``, ``'validation'``, ``'test'``}
+            The data part.
+        shard_len : int
+            Number of consecutive samples per shard.
+        shuffle : bool, optional
+            Whether to shuffle the shard order and the samples within each
+            shard. Default: ``True``.
+        reshape : tuple of (tuple or `None`), optional
+            Shapes to which the elements of each sample will be reshaped.
+        transform : callable, optional
+            Transform to be applied on each sample.
+        """
+        self.dataset = dataset
+        self.part = part
+        self.shard_len = shard_len
+        self.shuffle = shuffle
+        self.reshape = reshape or (
+            (None,) * dataset.get_num_elements_per_sample())
+        self.transform = transform
+
+    def __len__(self):
+        return self.dataset.get_len(self.part)
+
+    def __iter__(self):
+        return self.generate()
+
+    def _get_shard_starts(self):
+        shard_starts = list(range(0, len(self), self.shard_len))
+        worker_info = torch.utils.data.get_worker_info()
+        if self.shuffle:
+            generator = None
+            if worker_info is not None:
+                # all workers need the same shard order to split it
+                generator = torch.Generator()
+                generator.manual_seed(worker_info.seed - worker_info.id)
+            perm = torch.randperm(len(shard_starts), generator=generator)
+            shard_starts = [shard_starts[i] for i in perm.tolist()]
+        if worker_info is not None:
+            shard_starts = shard_starts[
+                worker_info.id::worker_info.num_workers]
+        return shard_starts
+
+    def generate(self):
+        for start in self._get_shard_starts():
+            stop = min(start + self.shard_len, len(self))
+            arrays = self.dataset.get_samples(range(start, stop),
+                                              part=self.part)
+            mult_elem = isinstance(arrays, tuple)
+            if not mult_elem:
+                arrays = (arrays,)
+            arrays = [np.asarray(arr) for arr in arrays]
+            order = (torch.randperm(stop - start).tolist() if self.shuffle
+                     else range(stop - start))
+            for i in order:
+                tensors = []
+                for arr, s in zip(arrays, self.reshape):
+                    t = torch.from_numpy(arr[i])
+                    if s is not None:
+                        t = t.view(*s)
+                    tensors.append(t)
+                sample = tuple(tensors) if mult_elem else tensors[0]
+                if self.transform is not None:
+                    sample = self.transform(sample)
+                yield sample
+
 
 class TorchRayTrafoParallel2DModule(torch.nn.Module):
     """
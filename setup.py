@@ -30,7 +30,8 @@ setup(name='dival',
       extras_require={
           'torch_learned_reconstructors': ['torch'],
           'training_logs': ['tensorboard'],
-          'direct_gpu_parallel_beam': ['tomosipo']
+          'direct_gpu_parallel_beam': ['tomosipo'],
+          'numba_kernels': ['numba']
       },
       include_package_data=True,
       zip_safe=False)
@@ -1,12 +1,23 @@
 # -*- coding: utf-8 -*-
 import unittest
 import os
+import pickle
+import tempfile
+import threading
+import warnings
 from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import h5py
 import odl
 from dival import get_standard_dataset
 from dival.datasets.dataset import Dataset
-from dival.datasets.lodopab_dataset import LoDoPaBDataset
+import dival.datasets.lodopab_dataset as lodopab_dataset
+from dival.datasets.lodopab_dataset import (
+    LoDoPaBDataset, NUM_SAMPLES_PER_FILE, PHOTONS_PER_PIXEL,
+    ORIG_MIN_PHOTON_COUNT, MIN_PHOTON_COUNT_THRES, _get_contiguous_layout,
+    _read_contiguous, _read_direct_chunks)
+from dival.util.constants import MU_MAX
 from dival.datasets.cached_dataset import CachedDataset, generate_cache_files
 from dival.datasets.angle_subset_dataset import AngleSubsetDataset
 
@@ -321,6 +332,21 @@ class TestLoDoPaBDataset(unittest.TestCase):
                     self.assertTrue(np.all(np.asarray(s_obs) == s2_obs))
                     self.assertTrue(np.all(np.asarray(s_gt) == s2_gt))
 
+    def test_get_samples_read_paths(self):
+        if not LoDoPaBDataset.check_for_lodopab():
+            return
+        d = LoDoPaBDataset(impl='skimage')
+        for part in ['train', 'validation', 'test']:
+            n = d.get_len(part)
+            for key in [slice(min(120, n-2), min(131, n)),
+                        slice(1, min(300, n), 7)]:
+                obs_ref = read_lodopab_reference('observation', part, key, n)
+                gt_ref = read_lodopab_reference('ground_truth', part, key, n)
+                for impl in ['h5py', 'direct_chunk']:
+                    obs, gt = d.get_samples(key, part, impl=impl)
+                    self.assertTrue(np.all(obs == obs_ref))
+                    self.assertTrue(np.all(gt == gt_ref))
+
     def test_generator(self):
         if not LoDoPaBDataset.check_for_lodopab():
             return
@@ -342,6 +368,484 @@ class TestLoDoPaBDataset(unittest.TestCase):
                     self.assertTrue(np.all(np.asarray(s_gt) == s2_gt))
 
 
+SYNTHETIC_LODOPAB_SHAPE = ((10, 8), (6, 6))
+# number of samples and h5py storage options of the observation and ground
+# truth files for each part
+SYNTHETIC_LODOPAB_PARTS = {
+    'train': (300,
+              {'chunks': (1, 10, 8), 'compression': 'gzip'},
+              {}),
+    'validation': (200,
+                   {},
+                   {'chunks': (4, 6, 6), 'compression': 'gzip'}),
+    'test': (50,
+             {'chunks': (1, 10, 8), 'compression': 'gzip', 'shuffle': True},
+             {'chunks': True})}
+
+
+def simulate_lodopab_observations(rng, n, shape):
+    """Simulate post-log observations from Poisson distributed photon counts
+    like in LoDoPaB, including zero photon counts."""
+    max_line_integral = -np.log(1 / PHOTONS_PER_PIXEL) / MU_MAX
+    line_integrals = 1.1 * max_line_integral * rng.rand(n, *shape)
+    photon_counts = rng.poisson(
+        PHOTONS_PER_PIXEL * np.exp(-line_integrals * MU_MAX)).astype(float)
+    photon_counts[photon_counts == 0.] = ORIG_MIN_PHOTON_COUNT
+    return (-np.log(photon_counts / PHOTONS_PER_PIXEL) / MU_MAX).astype(
+        np.float32)
+
+
+def write_synthetic_lodopab_files(data_path):
+    """Write small LoDoPaB-like HDF5 files with different storage layouts."""
+    rng = np.random.RandomState(42)
+    for part, (num_samples, obs_kwargs, gt_kwargs) in (
+            SYNTHETIC_LODOPAB_PARTS.items()):
+        for name, kwargs, shape in [
+                ('observation', obs_kwargs, SYNTHETIC_LODOPAB_SHAPE[0]),
+                ('ground_truth', gt_kwargs, SYNTHETIC_LODOPAB_SHAPE[1])]:
+            for i in range(0, num_samples, NUM_SAMPLES_PER_FILE):
+                n = min(NUM_SAMPLES_PER_FILE, num_samples - i)
+                data = (simulate_lodopab_observations(rng, n, shape)
+                        if name == 'observation' else
+                        rng.rand(n, *shape).astype(np.float32))
+                path = os.path.join(data_path, '{}_{}_{:03d}.hdf5'.format(
+                    name, part, i // NUM_SAMPLES_PER_FILE))
+                with h5py.File(path, 'w') as file:
+                    file.create_dataset('data', data=data, **kwargs)
+
+
+def create_synthetic_lodopab_dataset(**kwargs):
+    """Create a LoDoPaBDataset for the files written by
+    :func:`write_synthetic_lodopab_files`."""
+    with warnings.catch_warnings():
+        # patient ids are not available
+        warnings.simplefilter('ignore')
+        d = LoDoPaBDataset(impl='skimage', **kwargs)
+    d.shape = SYNTHETIC_LODOPAB_SHAPE
+    d.space = tuple(odl.uniform_discr([0, 0], [1, 1], shape, dtype=np.float32)
+                    for shape in SYNTHETIC_LODOPAB_SHAPE)
+    for part, (num_samples, _, _) in SYNTHETIC_LODOPAB_PARTS.items():
+        setattr(d, part + '_len', num_samples)
+    return d
+
+
+def read_lodopab_reference(name, part, key, len_part):
+    """Read samples of a LoDoPaB part via h5py's ``read_direct``."""
+    samples = []
+    for index in range(*key.indices(len_part)):
+        file_index, index_in_file = divmod(index, NUM_SAMPLES_PER_FILE)
+        path = os.path.join(lodopab_dataset.DATA_PATH, '{}_{}_{:03d}.hdf5'
+                            .format(name, part, file_index))
+        with h5py.File(path, 'r') as file:
+            dataset = file['data']
+            sample = np.empty((1,) + dataset.shape[1:], dtype=dataset.dtype)
+            dataset.read_direct(
+                sample, np.s_[index_in_file:index_in_file+1], np.s_[0:1])
+        samples.append(sample[0])
+    return np.stack(samples)
+
+
+def apply_lodopab_observation_model_reference(obs, observation_model,
+                                              min_photon_count):
+    """Apply the observation model and the photon count replacement of
+    :class:`LoDoPaBDataset` to post-log observations by boolean indexing."""
+    obs = obs.copy()
+    if observation_model == 'pre-log':
+        obs_post_log = obs.copy()
+        obs *= MU_MAX
+        np.exp(-obs, out=obs)
+    else:
+        obs_post_log = obs
+    if (min_photon_count is not None and
+            min_photon_count != ORIG_MIN_PHOTON_COUNT):
+        mask = obs_post_log >= MIN_PHOTON_COUNT_THRES
+        if observation_model == 'pre-log':
+            obs[mask] = min_photon_count / PHOTONS_PER_PIXEL
+        else:
+            with np.errstate(divide='ignore'):
+                obs[mask] = -np.log(
+                    min_photon_count / PHOTONS_PER_PIXEL) / MU_MAX
+    return obs
+
+
+class TestLoDoPaBDirectReads(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path_contiguous = os.path.join(self.tmp_dir.name, 'c.hdf5')
+        self.path_chunked = os.path.join(self.tmp_dir.name, 'ch.hdf5')
+        self.data = np.random.RandomState(0).rand(
+            NUM_SAMPLES_PER_FILE, 10, 8).astype(np.float32)
+        with h5py.File(self.path_contiguous, 'w') as file:
+            file.create_dataset('data', data=self.data)
+        with h5py.File(self.path_chunked, 'w') as file:
+            file.create_dataset('data', data=self.data, chunks=(1, 10, 8),
+                                compression='gzip')
+        # h5py storage options of chunked files, and whether the chunks can
+        # be read directly
+        self.chunked_layouts = {
+            'gzip': ({'chunks': (1, 10, 8), 'compression': 'gzip'}, True),
+            'gzip_multi': ({'chunks': (3, 10, 8), 'compression': 'gzip'},
+                           True),
+            'gzip_shuffle': ({'chunks': (1, 10, 8), 'compression': 'gzip',
+                              'shuffle': True}, False),
+            'auto': ({'chunks': True}, False),
+            'uncompressed': ({'chunks': (1, 10, 8)}, False)}
+        for layout, (kwargs, _) in self.chunked_layouts.items():
+            with h5py.File(self.get_chunked_path(layout), 'w') as file:
+                file.create_dataset('data', data=self.data, **kwargs)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_chunked_path(self, layout):
+        return os.path.join(self.tmp_dir.name, layout + '.hdf5')
+
+    def read_direct(self, path, out, slc_f, slc_d):
+        with h5py.File(path, 'r') as file:
+            file['data'].read_direct(out, slc_f, slc_d)
+
+    def test_get_contiguous_layout(self):
+        with h5py.File(self.path_contiguous, 'r') as file:
+            layout = _get_contiguous_layout(file['data'])
+        if not hasattr(os, 'preadv'):
+            self.assertIsNone(layout)
+            return
+        self.assertEqual(layout[1:], (self.data.dtype, self.data.shape))
+        with h5py.File(self.path_chunked, 'r') as file:
+            self.assertIsNone(_get_contiguous_layout(file['data']))
+
+    def test_read_contiguous(self):
+        if not hasattr(os, 'preadv'):
+            return
+        with h5py.File(self.path_contiguous, 'r') as file:
+            layout = _get_contiguous_layout(file['data'])
+        for slc_f, slc_d in [(np.s_[0:128], np.s_[0:128]),
+                             (np.s_[5:17], np.s_[3:15]),
+                             (np.s_[120:], np.s_[0:8]),
+                             (np.s_[127:128], np.s_[14:15])]:
+            out = np.zeros((128, 10, 8), dtype=np.float32)
+            self.assertTrue(_read_contiguous(
+                self.path_contiguous, layout, out, slc_f, slc_d))
+            out_ref = np.zeros((128, 10, 8), dtype=np.float32)
+            self.read_direct(self.path_contiguous, out_ref, slc_f, slc_d)
+            self.assertTrue(np.all(out == out_ref))
+
+    def test_read_contiguous_fallback(self):
+        if not hasattr(os, 'preadv'):
+            return
+        with h5py.File(self.path_contiguous, 'r') as file:
+            layout = _get_contiguous_layout(file['data'])
+        cases = [
+            # strided slice into the file
+            (np.zeros((128, 10, 8), dtype=np.float32), np.s_[0:30:3],
+             np.s_[0:10]),
+            # other data type
+            (np.zeros((128, 10, 8), dtype=np.float64), np.s_[0:10],
+             np.s_[0:10]),
+            # not C-contiguous
+            (np.zeros((128, 10, 16), dtype=np.float32)[:, :, ::2],
+             np.s_[0:10], np.s_[0:10]),
+            # shape mismatch
+            (np.zeros((128, 80), dtype=np.float32), np.s_[0:10],
+             np.s_[0:10])]
+        for out, slc_f, slc_d in cases:
+            self.assertFalse(_read_contiguous(
+                self.path_contiguous, layout, out, slc_f, slc_d))
+            self.assertTrue(np.all(out == 0.))
+
+    def test_read_direct_chunks(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for layout, (_, supported) in self.chunked_layouts.items():
+                path = self.get_chunked_path(layout)
+                for slc_f, slc_d in [(np.s_[0:128], np.s_[0:128]),
+                                     (np.s_[5:17], np.s_[3:15]),
+                                     (np.s_[1:128:3], np.s_[0:43]),
+                                     (np.s_[126:], np.s_[40:42])]:
+                    out = np.zeros((128, 10, 8), dtype=np.float32)
+                    with h5py.File(path, 'r') as file:
+                        futures = _read_direct_chunks(
+                            file['data'], out, slc_f, slc_d, executor)
+                    if not supported:
+                        self.assertIsNone(futures)
+                        self.assertTrue(np.all(out == 0.))
+                        continue
+                    for future in futures:
+                        future.result()
+                    out_ref = np.zeros((128, 10, 8), dtype=np.float32)
+                    self.read_direct(path, out_ref, slc_f, slc_d)
+                    self.assertTrue(np.all(out == out_ref))
+                # other data type
+                out = np.zeros((128, 10, 8), dtype=np.float64)
+                with h5py.File(path, 'r') as file:
+                    self.assertIsNone(_read_direct_chunks(
+                        file['data'], out, np.s_[0:10], np.s_[0:10],
+                        executor))
+            with h5py.File(self.path_contiguous, 'r') as file:
+                self.assertIsNone(_read_direct_chunks(
+                    file['data'], np.zeros((128, 10, 8), dtype=np.float32),
+                    np.s_[0:10], np.s_[0:10], executor))
+
+
+class TestLoDoPaBDatasetSyntheticFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_path_orig = lodopab_dataset.DATA_PATH
+        lodopab_dataset.DATA_PATH = self.tmp_dir.name
+        write_synthetic_lodopab_files(self.tmp_dir.name)
+        self.d = create_synthetic_lodopab_dataset()
+
+    def tearDown(self):
+        lodopab_dataset.DATA_PATH = self.data_path_orig
+        self.tmp_dir.cleanup()
+
+    def get_keys(self, part):
+        n = self.d.get_len(part)
+        return [range(0, n), range(1, n, 3),
+                slice(min(120, n-2), min(131, n)), slice(-3, None)]
+
+    def test_get_samples(self):
+        for part in ['train', 'validation', 'test']:
+            n = self.d.get_len(part)
+            for key in self.get_keys(part):
+                key_slice = (slice(key.start, key.stop, key.step)
+                             if isinstance(key, range) else key)
+                obs_ref = read_lodopab_reference('observation', part,
+                                                 key_slice, n)
+                gt_ref = read_lodopab_reference('ground_truth', part,
+                                                key_slice, n)
+                # twice, the file layouts are determined on first access
+                for impl in ['h5py', 'h5py', 'direct_chunk']:
+                    obs, gt = self.d.get_samples(key, part, impl=impl)
+                    self.assertTrue(np.all(obs == obs_ref))
+                    self.assertTrue(np.all(gt == gt_ref))
+            for index in [0, 127, 128, n-1]:
+                if index >= n:
+                    continue
+                key = slice(index, index+1)
+                obs_ref = read_lodopab_reference('observation', part, key, n)
+                gt_ref = read_lodopab_reference('ground_truth', part, key, n)
+                obs, gt = self.d.get_sample(index, part)
+                self.assertTrue(np.all(np.asarray(obs) == obs_ref[0]))
+                self.assertTrue(np.all(np.asarray(gt) == gt_ref[0]))
+
+    def test_get_samples_reuse_buffers(self):
+        obs_ref, gt_ref = self.d.get_samples(range(10, 20))
+        obs, gt = self.d.get_samples(range(0, 10), reuse_buffers=True)
+        obs2, gt2 = self.d.get_samples(range(10, 20), reuse_buffers=True)
+        self.assertIs(obs2, obs)
+        self.assertIs(gt2, gt)
+        self.assertTrue(np.all(obs == obs_ref))
+        self.assertTrue(np.all(gt == gt_ref))
+        self.assertFalse(np.shares_memory(obs, gt))
+        # buffers are kept per number of samples
+        obs3, gt3 = self.d.get_samples(range(0, 5), reuse_buffers=True)
+        self.assertFalse(np.shares_memory(obs3, obs))
+        self.assertFalse(np.shares_memory(gt3, gt))
+        obs4, gt4 = self.d.get_samples(range(10, 20))
+        self.assertFalse(np.shares_memory(obs4, obs))
+        self.assertFalse(np.shares_memory(gt4, gt))
+        obs5, gt5 = self.d.get_samples(range(0, 10), out=(True, False),
+                                       reuse_buffers=True)
+        self.assertIs(obs5, obs)
+        self.assertIsNone(gt5)
+
+    def test_get_samples_dtype(self):
+        key = range(120, 140)
+        obs_ref, gt_ref = self.d.get_samples(key)
+        for dtype in [np.float16, np.float64]:
+            obs, gt = self.d.get_samples(key, dtype=dtype)
+            self.assertEqual(obs.dtype, dtype)
+            self.assertEqual(gt.dtype, dtype)
+            self.assertTrue(np.all(obs == obs_ref.astype(dtype)))
+            self.assertTrue(np.all(gt == gt_ref.astype(dtype)))
+        # the float32 buffers used for the conversion are reused
+        staging_buffers = self.d._get_staging_buffers(len(key))
+        self.d.get_samples(key, dtype=np.float16)
+        for buf, buf2 in zip(staging_buffers,
+                             self.d._get_staging_buffers(len(key))):
+            self.assertTrue(np.shares_memory(buf, buf2))
+        # the data type of arrays passed in `out` takes precedence
+        out_obs = np.empty((len(key),) + self.d.shape[0], dtype=np.float16)
+        obs, gt = self.d.get_samples(key, out=(out_obs, True))
+        self.assertIs(obs, out_obs)
+        self.assertEqual(gt.dtype, np.float32)
+        self.assertTrue(np.all(obs == obs_ref.astype(np.float16)))
+        self.assertTrue(np.all(gt == gt_ref))
+        out_gt = np.empty((len(key),) + self.d.shape[1], dtype=np.float32)
+        obs, gt = self.d.get_samples(key, out=(False, out_gt),
+                                     dtype=np.float16)
+        self.assertIsNone(obs)
+        self.assertIs(gt, out_gt)
+        self.assertTrue(np.all(gt == gt_ref))
+        obs_ref, gt_ref = self.d.get_samples(range(0, 20))
+        gen = self.d.generator_arrays(batch_size=20, dtype=np.float16)
+        obs, gt = next(gen)
+        gen.close()
+        self.assertEqual(obs.dtype, np.float16)
+        self.assertEqual(gt.dtype, np.float16)
+        self.assertTrue(np.all(obs == obs_ref.astype(np.float16)))
+        self.assertTrue(np.all(gt == gt_ref.astype(np.float16)))
+
+    def test_generator_arrays(self):
+        for part in ['train', 'validation', 'test']:
+            n = self.d.get_len(part)
+            obs_ref, gt_ref = self.d.get_samples(range(0, n), part)
+            for batch_size in [1, 7, 128, n+5]:
+                for reuse_buffers in [True, False]:
+                    obs_batches, gt_batches = [], []
+                    for obs, gt in self.d.generator_arrays(
+                            part, batch_size=batch_size,
+                            reuse_buffers=reuse_buffers):
+                        self.assertEqual(len(obs), len(gt))
+                        self.assertLessEqual(len(obs), batch_size)
+                        # reused buffers are only valid until the next batch
+                        obs_batches.append(obs.copy() if reuse_buffers
+                                           else obs)
+                        gt_batches.append(gt.copy() if reuse_buffers else gt)
+                    self.assertTrue(all(len(obs) == batch_size
+                                        for obs in obs_batches[:-1]))
+                    self.assertTrue(np.all(
+                        np.concatenate(obs_batches) == obs_ref))
+                    self.assertTrue(np.all(
+                        np.concatenate(gt_batches) == gt_ref))
+
+    def test_generator_arrays_close(self):
+        threads_before = set(threading.enumerate())
+        gen = self.d.generator_arrays('train', batch_size=7)
+        next(gen)
+        gen.close()
+        self.assertEqual(set(threading.enumerate()) - threads_before, set())
+
+    def test_generator_arrays_exception(self):
+        get_samples = self.d.get_samples
+
+        def get_samples_failing(key, *args, **kwargs):
+            if key.start >= 14:
+                raise OSError('read error')
+            return get_samples(key, *args, **kwargs)
+
+        self.d.get_samples = get_samples_failing
+        threads_before = set(threading.enumerate())
+        gen = self.d.generator_arrays('train', batch_size=7)
+        next(gen)
+        next(gen)
+        with self.assertRaises(OSError):
+            next(gen)
+        self.assertEqual(set(threading.enumerate()) - threads_before, set())
+
+    def test_generator(self):
+        for part in ['train', 'validation', 'test']:
+            n = self.d.get_len(part)
+            obs_ref, gt_ref = self.d.get_samples(range(0, n), part)
+            samples = list(self.d.generator(part))
+            self.assertEqual(len(samples), n)
+            for (obs, gt), s_obs_ref, s_gt_ref in zip(samples, obs_ref,
+                                                      gt_ref):
+                self.assertIn(obs, self.d.space[0])
+                self.assertIn(gt, self.d.space[1])
+                self.assertTrue(np.all(np.asarray(obs) == s_obs_ref))
+                self.assertTrue(np.all(np.asarray(gt) == s_gt_ref))
+
+    def test_close(self):
+        obs_ref, gt_ref = self.d.get_sample(0)
+        self.d.get_sample(NUM_SAMPLES_PER_FILE)
+        file_cache, _ = self.d._get_file_cache()
+        files = list(file_cache.values())
+        self.assertEqual(len(files), 4)
+        self.d.close()
+        self.assertEqual(len(file_cache), 0)
+        self.assertFalse(any(file.id.valid for file in files))
+        # files are reopened
+        obs, gt = self.d.get_sample(0)
+        self.assertTrue(np.all(np.asarray(obs) == np.asarray(obs_ref)))
+        self.assertTrue(np.all(np.asarray(gt) == np.asarray(gt_ref)))
+        # the contiguous ground truth file is read without opening it in h5py
+        # now that its layout is known
+        self.assertEqual(len(file_cache), 1)
+        self.d.close()
+
+    def test_file_cache_threads(self):
+        indices = range(0, 2 * NUM_SAMPLES_PER_FILE, 32)
+        barrier = threading.Barrier(len(indices))
+
+        def get_sample(index):
+            barrier.wait()
+            self.d.get_sample(index)
+            return self.d._get_file_cache()[0]
+
+        with ThreadPoolExecutor(len(indices)) as executor:
+            file_caches = list(executor.map(get_sample, indices))
+        self.assertTrue(all(file_cache is file_caches[0]
+                            for file_cache in file_caches))
+        # observation and ground truth files of the first two files
+        self.assertEqual(len(file_caches[0]), 4)
+        self.d.close()
+
+    def test_pickle(self):
+        obs_ref, gt_ref = self.d.get_sample(0)
+        d = pickle.loads(pickle.dumps(self.d))
+        obs, gt = d.get_sample(0)
+        self.assertTrue(np.all(np.asarray(obs) == np.asarray(obs_ref)))
+        self.assertTrue(np.all(np.asarray(gt) == np.asarray(gt_ref)))
+        self.assertIsNot(d._get_file_cache()[0], self.d._get_file_cache()[0])
+        d.close()
+        self.d.close()
+
+    def test_observation_trafo(self):
+        part = 'validation'
+        n = self.d.get_len(part)
+        obs_post_log = read_lodopab_reference('observation', part,
+                                              slice(0, n), n)
+        # the data contains zero photon counts
+        self.assertTrue(np.any(obs_post_log >= MIN_PHOTON_COUNT_THRES))
+        self.assertTrue(np.any(obs_post_log < MIN_PHOTON_COUNT_THRES))
+        numba_available = lodopab_dataset.NUMBA_AVAILABLE
+        try:
+            for use_numba in [False, True]:
+                lodopab_dataset.NUMBA_AVAILABLE = (numba_available and
+                                                   use_numba)
+                for observation_model in ['post-log', 'pre-log']:
+                    # values >= ORIG_MIN_PHOTON_COUNT are applied by clipping
+                    for min_photon_count in [None, 0., 0.01, 0.1, 0.5, 1.]:
+                        d = create_synthetic_lodopab_dataset(
+                            observation_model=observation_model,
+                            min_photon_count=min_photon_count)
+                        obs_ref = apply_lodopab_observation_model_reference(
+                            obs_post_log, observation_model,
+                            min_photon_count)
+                        self.check_observation_trafo(d, obs_ref)
+        finally:
+            lodopab_dataset.NUMBA_AVAILABLE = numba_available
+
+    def check_observation_trafo(self, d, obs_ref):
+        part = 'validation'
+        n = d.get_len(part)
+        for key in [range(0, n), range(1, n, 3), range(120, 140)]:
+            obs, _ = d.get_samples(key, part, out=(True, False))
+            self.assertTrue(np.allclose(obs, obs_ref[key], rtol=1e-6,
+                                        atol=0.))
+            # converted after the transform
+            obs, _ = d.get_samples(key, part, out=(True, False),
+                                   dtype=np.float64)
+            self.assertTrue(np.allclose(obs, obs_ref[key], rtol=1e-6,
+                                        atol=0.))
+        for index in [0, 127, 128, n-1]:
+            obs, _ = d.get_sample(index, part, out=(True, False))
+            self.assertIn(obs, d.space[0])
+            self.assertTrue(np.allclose(obs, obs_ref[index], rtol=1e-6,
+                                        atol=0.))
+            obs_element = d.space[0].element()
+            d.get_sample(index, part, out=(obs_element, False))
+            self.assertTrue(np.allclose(obs_element, obs_ref[index],
+                                        rtol=1e-6, atol=0.))
+            # non-contiguous array
+            obs_strided = np.zeros((d.shape[0][0], 2 * d.shape[0][1]),
+                                   dtype=np.float32)[:, ::2]
+            d.get_sample(index, part, out=(obs_strided, False))
+            self.assertTrue(np.allclose(obs_strided, obs_ref[index],
+                                        rtol=1e-6, atol=0.))
+
+
 class TestCachedDataset(unittest.TestCase):
     def setUp(self):
         class DummyGeneratorDataset(Dataset):
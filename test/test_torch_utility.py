@@ -8,7 +8,7 @@ except ImportError:
 else:
     TORCH_AVAILABLE = True
     from dival.util.torch_utility import (
-        RandomAccessTorchDataset, GeneratorTorchDataset,
+        RandomAccessTorchDataset, GeneratorTorchDataset, ShardedTorchDataset,
         load_state_dict_convert_data_parallel, TOMOSIPO_AVAILABLE,
         TorchRayTrafoParallel2DModule, TorchRayTrafoParallel2DAdjointModule)
 import numpy as np
@@ -44,6 +44,32 @@ def get_parallel_beam_dataset():
     dataset.ray_trafo = ray_trafo
     return dataset
 
+class SequenceRandomAccessDataset2(Dataset):
+    # defined at module level, such that it can be pickled for DataLoader
+    # workers
+    def __init__(self, train_len, validation_len, test_len):
+        self.space = (odl.uniform_discr([0, 0], [1, 1], (4, 4)),
+                      odl.uniform_discr([0, 0], [1, 1], (1, 1)))
+        self.train_len = train_len
+        self.validation_len = validation_len
+        self.test_len = test_len
+
+    def get_sample(self, index, part='train', out=None):
+        if index >= self.get_len(part):
+            raise ValueError('index out of bound')
+        if out is None:
+            out = (True, True)
+        out0, out1 = out
+        if isinstance(out0, bool):
+            out0 = self.space[0].zero() if out0 else None
+        if isinstance(out[1], bool):
+            out1 = self.space[1].zero() if out1 else None
+        if out0 is not None:
+            out0[:] = self.space[0].one() * index
+        if out1 is not None:
+            out1[:] = self.space[1].one() * index
+        return (out0, out1)
+
 @unittest.skipUnless(TORCH_AVAILABLE, 'PyTorch not available')
 class TestRandomAccessTorchDataset(unittest.TestCase):
     def setUp(self):
@@ -169,6 +195,50 @@ class TestGeneratorTorchDataset(unittest.TestCase):
                 assert np.all(obs_torch[0, :, 2:-2].numpy() == np.asarray(obs))
                 assert np.all(gt_torch[0, :, 1:-1].numpy() == np.asarray(gt))
 
+@unittest.skipUnless(TORCH_AVAILABLE, 'PyTorch not available')
+class TestShardedTorchDataset(unittest.TestCase):
+    def setUp(self):
+        self.TRAIN_LEN = 20
+        self.VALIDATION_LEN = 2
+        self.TEST_LEN = 2
+        self.SHARD_LEN = 3
+        self.dseq2 = SequenceRandomAccessDataset2(
+            train_len=self.TRAIN_LEN, validation_len=self.VALIDATION_LEN,
+            test_len=self.TEST_LEN)
+
+    def test(self):
+        for part in ['train', 'validation', 'test']:
+            for shuffle in [False, True]:
+                torch_dataset = self.dseq2.create_torch_dataset(
+                    part=part, reshape=((1,) + self.dseq2.space[0].shape,
+                                        (1,) + self.dseq2.space[1].shape),
+                    shard_len=self.SHARD_LEN, shuffle=shuffle)
+                assert isinstance(torch_dataset, ShardedTorchDataset)
+                assert len(torch_dataset) == self.dseq2.get_len(part)
+                indices = []
+                for obs_torch, gt_torch in torch_dataset:
+                    assert obs_torch.shape == (1,) + self.dseq2.space[0].shape
+                    assert gt_torch.shape == (1,) + self.dseq2.space[1].shape
+                    index = gt_torch[0, 0, 0].item()
+                    assert np.all(obs_torch.numpy() == index)
+                    indices.append(int(index))
+                if not shuffle:
+                    assert indices == list(range(len(torch_dataset)))
+                # the samples of each shard are yielded in one unbroken block
+                shards = [j // self.SHARD_LEN for j in indices]
+                shard_blocks = [shard for k, shard in enumerate(shards)
+                                if k == 0 or shards[k-1] != shard]
+                assert len(shard_blocks) == len(set(shard_blocks))
+                assert sorted(indices) == list(range(len(torch_dataset)))
+
+    def test_workers(self):
+        torch_dataset = self.dseq2.create_torch_dataset(
+            part='train', shard_len=self.SHARD_LEN)
+        data_loader = torch.utils.data.DataLoader(
+            torch_dataset, batch_size=None, num_workers=2)
+        indices = [int(gt[0, 0].item()) for _, gt in data_loader]
+        assert sorted(indices) == list(range(self.TRAIN_LEN))
+
 @unittest.skipUnless(
     TORCH_AVAILABLE and TOMOSIPO_AVAILABLE and ASTRA_CUDA_AVAILABLE,
     'PyTorch or tomosipo or ASTRA+CUDA not available')